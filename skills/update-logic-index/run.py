@@ -4,26 +4,68 @@
 Logic Indexer - Generates semantic summaries for source code using AST/regex analysis and OpenAI-compatible API.
 Features:
     - Multi-language support (Python, C, C++, TypeScript) via pluggable parsers
-    - Incremental updates via MD5 hashing
+    - Incremental updates via BLAKE2b content hashing
     - Concurrent API calls (ThreadPoolExecutor)
-    - Zero required external dependencies (Standard Library only; tree-sitter optional)
-Version: 2.0.0
+    - Zero required external dependencies (Standard Library only; tree-sitter, orjson, zstandard and httpx optional)
+Version: 2.1.0
 """
 
+import contextlib
+import email.utils
 import hashlib
+import importlib.util
+import io
 import json
 import os
 import sys
 import subprocess
 import time
 import random
+import string
+import threading
 import concurrent.futures
+import http.client
+import urllib.parse
 import urllib.request
 import urllib.error
 import ssl
 import fnmatch
+import re
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+ZSTD_AVAILABLE = False
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    pass
+
+# httpx takes ~0.1s to import, so it is only located here and imported once API calls are
+# actually needed (see _import_httpx); warm runs with nothing to summarize never pay for it.
+httpx = None
+HTTPX_AVAILABLE = importlib.util.find_spec("httpx") is not None
+HTTP2_AVAILABLE = HTTPX_AVAILABLE and importlib.util.find_spec("h2") is not None  # httpx needs h2 for http2=True
+
+
+def _import_httpx():
+    """Imports httpx on first use. Returns False if it turns out not to be importable."""
+    global httpx, HTTPX_AVAILABLE
+    if httpx is None and HTTPX_AVAILABLE:
+        try:
+            import httpx as module
+        except ImportError:
+            HTTPX_AVAILABLE = False
+        else:
+            httpx = module
+    return HTTPX_AVAILABLE
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
@@ -32,24 +74,177 @@ from parsers.python_parser import PythonParser
 from parsers.c_cpp_parser import CCppParser
 from parsers.ts_parser import TSParser
 
-VERSION = "2.0.0"
+VERSION = "2.1.0"
 CACHE_FILE = os.path.join(".claude", "logic_index.json")
+CACHE_FILE_ZST = CACHE_FILE + ".zst"
 CONFIG_FILE = os.path.join(".claude", "logic_index_config")
 OUTPUT_MD = os.path.join(".claude", "logic_tree.md")
 
 DEFAULT_MODEL = "glm-5"
 DEFAULT_API_URL = "https://coding.dashscope.aliyuncs.com/v1/chat/completions"
 DEFAULT_MAX_WORKERS = 5
+DEFAULT_MIN_WORKERS = 1
+DEFAULT_RPS = 5.0
+DEFAULT_BURST = 10
 DEFAULT_RETRY_LIMIT = 3
 DEFAULT_TIMEOUT = 300
+CONNECT_TIMEOUT = 10
+MAX_RETRY_WAIT = 60
 DEFAULT_MAX_TOKENS = 8192
+SMALL_MODEL_MAX_CHARS = 40000
 DEFAULT_LANG = "English"
 MAX_CTX_CHARS = 200000
+MAX_SEGMENT_CHARS = 8000
+DEFAULT_BATCH_FILES = 8
+SMALL_FILE_CHARS = 8000
+BATCH_SOURCE_CHARS = 32000
+PARSE_POOL_MIN_FILES = 64
+CHECKPOINT_INTERVAL = 30
+RACY_MTIME_NS = 2_000_000_000
+_GLOB_CHARS_RE = re.compile(r"[*?\[]")
+_ASCII_WHITESPACE = dict.fromkeys(c for c in range(128) if chr(c).isspace())
 
 DEFAULT_AUTO_INJECT = "ALWAYS"
 DEFAULT_FILTER_SMALL = False
 
 
+@contextlib.contextmanager
+def _atomic_open(path, mode='wb', **kwargs):
+    """Opens a temp sibling of path for writing and os.replace()s it into place on success.
+
+    Readers never observe a partially written file; on error the temp file is discarded.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _strip_whitespace(text):
+    """Same result as "".join(text.split()). str.translate is several times faster for ASCII
+    text but slower otherwise, so non-ASCII text keeps the split/join."""
+    if text.isascii():
+        return text.translate(_ASCII_WHITESPACE)
+    return "".join(text.split())
+
+
+def _read_source(path):
+    """Reads a UTF-8 source file with the newline translation of text mode ("\r\n" and "\r"
+    become "\n"). Decoding the raw bytes at once skips the text layer's incremental decoder,
+    about 30% faster on typical small files."""
+    with open(path, 'rb') as f:
+        source = f.read().decode('utf-8')
+    if '\r' in source:
+        source = source.replace('\r\n', '\n').replace('\r', '\n')
+    return source
+
+
+def _retry_after(headers):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _backoff_delay(retries, retry_after=None):
+    """Wait before retry number `retries`: the server's Retry-After when it sent one, else
+    exponential backoff (2s, 4s, 8s, ...) plus up to 1s of jitter; capped at MAX_RETRY_WAIT."""
+    if retry_after is not None:
+        return min(MAX_RETRY_WAIT, retry_after)
+    return min(MAX_RETRY_WAIT, 2 ** retries + random.random())
+
+
+def _strip_code_fence(text):
+    """Returns the body of a ```json / ``` fenced block, or text unchanged."""
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+def _compile_prompt_template(template):
+    """Pre-parses a str.format() template once into a renderer that only joins pieces.
+
+    Templates with format specs or conversions fall back to plain str.format().
+    """
+    pieces = []
+    slots = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if literal:
+            pieces.append(literal)
+        if field is None:
+            continue
+        if spec or conversion or not field.isidentifier():
+            return lambda **values: template.format(**values)
+        slots.append((len(pieces), field))
+        pieces.append("")
+
+    def render(**values):
+        out = pieces[:]
+        for index, field in slots:
+            out[index] = str(values[field])
+        return "".join(out)
+
+    return render
+
+
+class _GlobSetMatcher:
+    """Matches a path against a list of fnmatch globs, testing each against both the basename
+    and the relative path.
+
+    The common shapes are answered with set lookups and str.endswith: literal names ("venv",
+    "LICENSE"), "*.ext", and their "**/" forms (which fnmatch only matches below the root, as
+    "**/" needs a "/"). Whatever is left is matched by a single combined regex.
+    """
+
+    def __init__(self, patterns):
+        self.names, self.nested_names, self.suffixes, self.nested_suffixes = set(), set(), [], []
+        globs = []
+        for pattern in patterns:
+            nested = pattern.startswith("**/")
+            core = pattern[3:] if nested else pattern
+            suffix = core[1:] if core.startswith("*") else None
+            if "/" in core and nested:
+                globs.append(pattern)
+            elif not _GLOB_CHARS_RE.search(core):
+                (self.nested_names if nested else self.names).add(core)
+            elif suffix and "/" not in suffix and not _GLOB_CHARS_RE.search(suffix):
+                (self.nested_suffixes if nested else self.suffixes).append(suffix)
+            else:
+                globs.append(pattern)
+        self.suffixes = tuple(self.suffixes)
+        self.nested_suffixes = tuple(self.nested_suffixes)
+        self.regex = re.compile("|".join(fnmatch.translate(p) for p in globs)) if globs else None
+
+    def matches(self, rel_path, basename):
+        if basename in self.names or rel_path in self.names or basename.endswith(self.suffixes):
+            return True
+        if basename != rel_path and (basename in self.nested_names or basename.endswith(self.nested_suffixes)):
+            return True
+        return bool(self.regex and (self.regex.match(basename) or self.regex.match(rel_path)))
+
+
 class FatalError(Exception):
     """Triggers circuit breaker and halts execution."""
     pass
@@ -60,20 +255,195 @@ class TruncatedResponseError(Exception):
     pass
 
 
+class PromptTooLargeError(Exception):
+    """Raised when the API rejects a request because the prompt exceeds its input limit."""
+    pass
+
+
+class TokenBucket:
+    """Thread-safe token bucket pacing request starts to `rate` per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(max(1, capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                self._cond.wait((1 - self._tokens) / self.rate)
+
+    def penalize(self, seconds):
+        """Drains `seconds` worth of tokens (possibly below zero) so every sender pauses after a 429."""
+        with self._cond:
+            self._refill()
+            self._tokens = max(-self.capacity, self._tokens - seconds * self.rate)
+
+
+class ConcurrencyController:
+    """AIMD limit on in-flight API calls, shared by all worker threads.
+
+    Starts at the ceiling, halves on HTTP 429 (at most once per round of in-flight
+    requests) and grows by 25% after every WINDOW successful calls whose mean
+    latency stays within 2x of the running EWMA.
+    """
+
+    WINDOW = 20
+
+    def __init__(self, floor, ceiling):
+        self.ceiling = max(1, ceiling)
+        self.floor = max(1, min(floor, self.ceiling))
+        self.limit = float(self.ceiling)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._latency_ewma = None
+        self._baseline = None
+        self._window_total = 0.0
+        self._window_count = 0
+        self._last_decrease = 0.0
+
+    def acquire(self):
+        """Blocks until a slot is free; returns the start timestamp to hand back to release()."""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, ok=True, rate_limited=False):
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                # Requests started before the last decrease were already counted in it.
+                if started >= self._last_decrease:
+                    self._set_limit(self.limit / 2, "rate limited")
+                    self._last_decrease = time.monotonic()
+                    self._reset_window()
+            elif ok:
+                latency = time.monotonic() - started
+                if self._latency_ewma is None:
+                    self._latency_ewma = latency
+                else:
+                    self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+                self._window_total += latency
+                self._window_count += 1
+                if self._window_count >= self.WINDOW:
+                    mean = self._window_total / self._window_count
+                    if self._baseline is None or mean <= 2 * self._baseline:
+                        self._set_limit(max(self.limit * 1.25, self.limit + 1), "healthy")
+                    self._reset_window()
+            self._cond.notify_all()
+
+    def _reset_window(self):
+        self._baseline = self._latency_ewma
+        self._window_total = 0.0
+        self._window_count = 0
+
+    def _set_limit(self, new_limit, reason):
+        old = int(self.limit)
+        self.limit = min(float(self.ceiling), max(float(self.floor), new_limit))
+        if int(self.limit) != old:
+            print(f"\nConcurrency {old} -> {int(self.limit)} ({reason})")
+
+
+_parse_worker = None
+
+
+def _init_parse_worker(root_dir, cache, hash_cache, filter_small):
+    """ProcessPoolExecutor initializer: builds this process's parse-only indexer once."""
+    global _parse_worker
+    _parse_worker = LogicIndexer.for_parse_worker(root_dir, cache, hash_cache, filter_small)
+
+
+def _parse_one(task):
+    """Parses one file in a pool process.
+
+    Returns (file_node, dirty, symbol_keys, deduplicated, source) in a single pickle so the
+    symbol dicts referenced by dirty/symbol_keys stay the same objects as those in file_node.
+    source is only sent back for files with symbols queued for the LLM.
+    """
+    full_path, rel_path, parser_index, st = task
+    worker = _parse_worker
+    worker.dirty_nodes = []
+    worker._symbol_keys = []
+    worker.stats["deduplicated"] = 0
+    worker._sources = {}
+    file_node = worker.parse_file(full_path, rel_path, worker.parsers[parser_index], st)
+    dirty = [(symbol, segment, content_key) for _, symbol, segment, _, content_key in worker.dirty_nodes]
+    return file_node, dirty, worker._symbol_keys, worker.stats["deduplicated"], worker._sources.get(rel_path)
+
+
 class LogicIndexer:
+    SYMBOL_ICONS = {
+        "class": "C",
+        "function": "f",
+        "struct": "S",
+        "enum": "E",
+        "typedef": "T",
+        "type_alias": "T",
+        "macro": "M",
+        "namespace": "N",
+        "interface": "I",
+    }
+
+    @classmethod
+    def for_parse_worker(cls, root_dir, cache, hash_cache, filter_small):
+        """Builds a parse-only instance for pool processes.
+
+        Skips __init__ (config, API clients); only the state parse_file() and
+        _process_symbol() read is set up.
+        """
+        self = cls.__new__(cls)
+        self.root_dir = root_dir
+        self.cache = cache
+        self.hash_cache = hash_cache
+        self.filter_small = filter_small
+        self.parsers = [PythonParser(), CCppParser(), TSParser()]
+        self.stats = {"deduplicated": 0}
+        self.dirty_nodes = []
+        self._symbol_keys = []
+        self._deps_signatures = {}
+        self._dep_entry_cache = {}
+        self._sources = {}
+        return self
+
     def __init__(self, root_dir):
         self.root_dir = os.path.abspath(root_dir)
 
         self.api_key = os.environ.get("OPENAI_API_KEY")
         self.model = os.environ.get("OPENAI_MODEL", DEFAULT_MODEL)
+        self.small_model = os.environ.get("OPENAI_SMALL_MODEL") or None
         self.base_url = os.environ.get("OPENAI_BASE_URL", DEFAULT_API_URL)
-        self.circuit_open = False
+        self._halt = threading.Event()
 
         try:
             self.max_workers = int(os.environ.get("OPENAI_MAX_WORKERS", DEFAULT_MAX_WORKERS))
         except ValueError:
             self.max_workers = DEFAULT_MAX_WORKERS
 
+        try:
+            self.min_workers = int(os.environ.get("OPENAI_MIN_WORKERS", DEFAULT_MIN_WORKERS))
+        except ValueError:
+            self.min_workers = DEFAULT_MIN_WORKERS
+        self.concurrency = ConcurrencyController(self.min_workers, self.max_workers)
+
+        try:
+            rps = float(os.environ.get("OPENAI_RPS", DEFAULT_RPS))
+        except ValueError:
+            rps = DEFAULT_RPS
+        self.rate_limiter = TokenBucket(rps, DEFAULT_BURST) if rps > 0 else None
+
         try:
             self.max_tokens = int(os.environ.get("OPENAI_MAX_TOKENS", DEFAULT_MAX_TOKENS))
         except ValueError:
@@ -88,17 +458,47 @@ class LogicIndexer:
             self.timeout = int(os.environ.get("OPENAI_TIMEOUT", DEFAULT_TIMEOUT))
         except ValueError:
             self.timeout = DEFAULT_TIMEOUT
+        # Connecting (incl. the TLS handshake) fails fast; only waiting for a reply gets the full timeout.
+        self.connect_timeout = min(CONNECT_TIMEOUT, self.timeout)
+
+        try:
+            self.batch_files = max(1, int(os.environ.get("LOGIC_INDEX_BATCH_FILES", DEFAULT_BATCH_FILES)))
+        except ValueError:
+            self.batch_files = DEFAULT_BATCH_FILES
 
         self.filter_small = str(os.environ.get("LOGIC_INDEX_FILTER_SMALL", DEFAULT_FILTER_SMALL)).lower() == "true"
+        try:
+            self.parse_workers = int(os.environ.get("LOGIC_INDEX_PARSE_WORKERS", os.cpu_count() or 1))
+        except ValueError:
+            self.parse_workers = os.cpu_count() or 1
         remy_lang = os.environ.get("REMY_LANG", "en")
         self.lang = {"zh-CN": "Simplified Chinese", "en": "English"}.get(remy_lang, DEFAULT_LANG)
 
+        self.compress_cache = str(os.environ.get("LOGIC_INDEX_COMPRESS_CACHE", "false")).lower() == "true"
+        self.use_batch_api = str(os.environ.get("LOGIC_INDEX_BATCH_API", "false")).lower() == "true"
+        self.verify_ssl = str(os.environ.get("OPENAI_VERIFY_SSL", "true")).lower() != "false"
+        if self.compress_cache and not ZSTD_AVAILABLE:
+            print("Warning: LOGIC_INDEX_COMPRESS_CACHE needs the zstandard package. Writing plain JSON.")
+
+        self.parsers = [PythonParser(), CCppParser(), TSParser()]
+        self.prompt_digest = self._prompt_digest()
+
         self.exclusions = []
         self._load_config()
         self.cache = self._load_cache()
+        self.hash_cache = self.cache.get("_meta", {}).get("hash_cache", {})
+        # Batch API job submitted by an earlier run: {"id": ..., "requests": {custom_id: [[name, content_key], ...]}}
+        self.pending_batch = self.cache.get("_meta", {}).get("pending_batch")
+        self.pending_batch_status = None  # as last reported by the API; None when it could not be fetched
+        # Digest of the source file paths the cached import lists were resolved against.
+        self.file_set = self.cache.get("_meta", {}).get("file_set")
         self.dirty_nodes = []
+        self._symbol_keys = []
+        self._deps_signatures = {}
+        self._dep_entry_cache = {}
+        self._sources = {}
+        self._scan_complete = False
 
-        self.parsers = [PythonParser(), CCppParser(), TSParser()]
         self._extension_map = {}
         for parser in self.parsers:
             for ext in parser.get_extensions():
@@ -110,20 +510,38 @@ class LogicIndexer:
             "processed_files": 0,
             "api_calls": 0,
             "failed_files": 0,
+            "deduplicated": 0,
             "token_usage_estimate": 0,
             "languages": {},
         }
 
-        self.ssl_context = ssl.create_default_context()
-        self.ssl_context.check_hostname = False
-        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._prompt_renderers = {}
+        self._prompt_lock = threading.Lock()
+
+        # Transport state is set up by _init_transport() once there is something to send.
+        self.ssl_context = None
+        self.http_client = None
+        self._conn_local = threading.local()
+        self._keepalive_conns = set()  # open per-thread connections, closed when the LLM phase ends
+
+    @property
+    def circuit_open(self):
+        """Circuit breaker state, backed by an Event so sleeping/queued workers can wake on it."""
+        return self._halt.is_set()
+
+    @circuit_open.setter
+    def circuit_open(self, value):
+        if value:
+            self._halt.set()
+        else:
+            self._halt.clear()
 
     def _get_parser_for_file(self, filename):
         """Return the appropriate parser for a file, or None."""
-        for ext, parser in self._extension_map.items():
-            if filename.endswith(ext):
-                return parser
-        return None
+        dot = filename.rfind(".")
+        if dot < 0:
+            return None
+        return self._extension_map.get(filename[dot:])
 
     def _load_config(self):
         config_path = os.path.join(self.root_dir, CONFIG_FILE)
@@ -151,53 +569,163 @@ class LogicIndexer:
                         self.exclusions.append(line[1:])
         else:
             self.exclusions = [".git/", "__pycache__/", "venv/", "node_modules/", ".claude/", "dist/", "build/"]
+        self._compile_exclusions()
+
+    def _compile_exclusions(self):
+        """Compiles the exclusion globs into one matcher for directory-only patterns and one for the rest."""
+        self._fold_case = os.name == "nt"  # fnmatch is case-insensitive on Windows
+        patterns = [p.lower() for p in self.exclusions] if self._fold_case else self.exclusions
+        self._dir_matcher = _GlobSetMatcher([p.rstrip("/") for p in patterns if p.endswith("/")])
+        self._any_matcher = _GlobSetMatcher([p for p in patterns if not p.endswith("/")])
+
+    def _is_excluded(self, path, is_dir=None, rel_path=None):
+        if rel_path is None:
+            rel_path = os.path.relpath(path, self.root_dir).replace(os.sep, "/")
+            if rel_path == ".":
+                return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if self._fold_case:
+            rel_path = rel_path.lower()
+
+        basename = rel_path.rsplit("/", 1)[-1]
+        if self._any_matcher.matches(rel_path, basename):
+            return True
+        return is_dir and self._dir_matcher.matches(rel_path, basename)
+
+    def _walk(self, dirpath, rel_prefix=""):
+        """Yields (DirEntry, rel_path) for every file below dirpath, pruning excluded directories.
+
+        rel_path is accumulated per level from DirEntry names, so no relpath/join is needed per file.
+        The entry's stat() is cached (and free on Windows, where the listing carries it).
+        """
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            return
 
-    def _is_excluded(self, path):
-        rel_path = os.path.relpath(path, self.root_dir).replace(os.sep, "/")
-        if rel_path == ".":
-            return False
-
-        basename = os.path.basename(rel_path)
-        is_dir = os.path.isdir(path)
-
-        for pattern in self.exclusions:
-            must_be_dir = pattern.endswith("/")
-            clean_pattern = pattern.rstrip("/")
-
-            if must_be_dir and not is_dir:
-                continue
-
-            if fnmatch.fnmatch(basename, clean_pattern) or fnmatch.fnmatch(rel_path, clean_pattern):
-                return True
-        return False
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry)
+            else:
+                yield entry, rel_prefix + entry.name
+
+        for entry in subdirs:
+            sub_rel = rel_prefix + entry.name
+            if not self._is_excluded(entry.path, is_dir=True, rel_path=sub_rel):
+                yield from self._walk(entry.path, sub_rel + "/")
+
+    def _cache_path(self):
+        """Returns the cache file to load: the newer of the plain and zstd files that can be read."""
+        candidates = [CACHE_FILE]
+        if os.path.exists(CACHE_FILE_ZST):
+            if ZSTD_AVAILABLE:
+                candidates.append(CACHE_FILE_ZST)
+            else:
+                print(f"Warning: Ignoring {CACHE_FILE_ZST} (zstandard is not installed).")
+        existing = [path for path in candidates if os.path.exists(path)]
+        if not existing:
+            return None
+        return max(existing, key=os.path.getmtime)
+
+    def _prompt_digest(self):
+        """Digest of the prompt templates and reply language. Summaries written under a different
+        prompt are stale even where the code is not, so a change resets the cache."""
+        h = hashlib.blake2b(self.lang.encode('utf-8'), digest_size=16)
+        for path in sorted({parser.get_prompt_template_path() for parser in self.parsers}):
+            h.update(b"\0")
+            try:
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+            except OSError:
+                pass
+        return h.hexdigest()
 
     def _load_cache(self):
-        if os.path.exists(CACHE_FILE):
+        path = self._cache_path()
+        if path:
             try:
-                with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    cache_version = data.get("_meta", {}).get("version", "1.4.0")
-                    if cache_version != VERSION:
-                        print(f"检测到缓存版本升级 ({cache_version} -> {VERSION})。正在重置缓存...")
-                        return {}
-                    return data
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                if path == CACHE_FILE_ZST:
+                    raw = zstandard.ZstdDecompressor().decompress(raw)
+                data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+                cache_version = data.get("_meta", {}).get("version", "1.4.0")
+                if cache_version != VERSION:
+                    print(f"检测到缓存版本升级 ({cache_version} -> {VERSION})。正在重置缓存...")
+                    return {}
+                # Caches written before the digest was recorded are taken as current.
+                if data.get("_meta", {}).get("prompt_digest", self.prompt_digest) != self.prompt_digest:
+                    print("检测到提示词模板变更。正在重置缓存...")
+                    return {}
+                return data
             except Exception:
                 pass
         return {}
 
     def _save_cache(self):
         os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        if self._scan_complete:
+            self.hash_cache = {
+                key: sym["summary"] for key, sym in self._symbol_keys
+                if sym.get("summary") and not sym["summary"].startswith("Error")
+            }
         self.cache["_meta"] = {
             "last_updated": datetime.now().isoformat(),
             "model": self.model,
-            "version": VERSION
+            "version": VERSION,
+            "prompt_digest": self.prompt_digest,
+            "hash_cache": self.hash_cache
         }
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, ensure_ascii=False, indent=2)
+        if self.file_set:
+            self.cache["_meta"]["file_set"] = self.file_set
+        if self.pending_batch:
+            self.cache["_meta"]["pending_batch"] = self.pending_batch
+        # Compact output: indent=2 forces the stdlib onto its pure-Python encoder (~3x slower)
+        # and makes the file about a third larger.
+        if ORJSON_AVAILABLE:
+            data = orjson.dumps(self.cache, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            data = json.dumps(self.cache, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        path, stale = CACHE_FILE, CACHE_FILE_ZST
+        if self.compress_cache and ZSTD_AVAILABLE:
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+            path, stale = CACHE_FILE_ZST, CACHE_FILE
+        with _atomic_open(path, 'wb') as f:
+            f.write(data)
+        # Leave a .zst cache alone when it cannot be read here; it may be wanted again once zstandard is back.
+        if os.path.exists(stale) and (stale != CACHE_FILE_ZST or ZSTD_AVAILABLE):
+            os.remove(stale)
 
     def _calculate_hash(self, source_code, extra_data=""):
-        normalized = "".join(source_code.split()) + extra_data
-        return hashlib.md5(normalized.encode('utf-8')).hexdigest()
+        h = hashlib.blake2b(_strip_whitespace(source_code).encode('utf-8'), digest_size=16)
+        if extra_data:
+            h.update(extra_data.encode('utf-8'))
+        return h.hexdigest()
+
+    def _chat_request(self, prompt):
+        """Request body of a chat completion for prompt.
+
+        Prompts up to SMALL_MODEL_MAX_CHARS go to OPENAI_SMALL_MODEL when one is configured:
+        short summaries of small files rarely need the larger model, which costs and takes more.
+        """
+        model = self.model
+        if self.small_model and len(prompt) <= SMALL_MODEL_MAX_CHARS:
+            model = self.small_model
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": f"You are a code analysis assistant. Respond in {self.lang}. Respond with valid JSON only."},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.2,
+            "n": 1,
+            "max_tokens": self.max_tokens,
+            "response_format": {"type": "json_object"}
+        }
 
     def _call_llm(self, prompt):
         if not self.api_key:
@@ -212,61 +740,47 @@ class LogicIndexer:
             "Authorization": f"Bearer {self.api_key}",
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         }
-        data = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": f"You are a code analysis assistant. Respond in {self.lang}. Respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.2,
-            "max_tokens": self.max_tokens,
-            "response_format": {"type": "json_object"}
-        }
+        data = self._chat_request(prompt)
 
         self.stats["api_calls"] += 1
+        self.stats["token_usage_estimate"] += len(prompt) // 4
         retries = 0
         while retries <= self.retry_limit:
             try:
-                req = urllib.request.Request(url, data=json.dumps(data).encode('utf-8'), headers=headers)
-                with urllib.request.urlopen(req, context=self.ssl_context, timeout=self.timeout) as response:
-                    raw_data = response.read().decode('utf-8')
-                    result = json.loads(raw_data)
-                    try:
-                        text_content = result['choices'][0]['message']['content'].strip()
-
-                        if "```json" in text_content:
-                            text_content = text_content.split("```json")[1].split("```")[0].strip()
-                        elif "```" in text_content:
-                            text_content = text_content.split("```")[1].split("```")[0].strip()
-
-                        if not text_content.strip().endswith(('}', ']')):
-                            raise TruncatedResponseError("Response truncated (incomplete JSON)")
-
-                        try:
-                            json.loads(text_content)
-                            return text_content
-                        except json.JSONDecodeError:
-                            pass
-                        return text_content
-                    except (KeyError, IndexError):
-                        print(f"API Debug - Response Structure: {json.dumps(result)[:500]}")
-                        return "Error: Unexpected API response format."
+                raw_data = self._post_limited(url, json.dumps(data).encode('utf-8'), headers)
+                result = orjson.loads(raw_data) if ORJSON_AVAILABLE else json.loads(raw_data)
+                try:
+                    choice = result['choices'][0]
+                    text_content = _strip_code_fence(choice['message']['content'].strip())
+
+                    # Callers parse the reply themselves; only truncation is checked here.
+                    if choice.get('finish_reason') == 'length' or not text_content.endswith(('}', ']')):
+                        raise TruncatedResponseError("Response truncated (incomplete JSON)")
+                    return text_content
+                except (KeyError, IndexError):
+                    print(f"API Debug - Response Structure: {json.dumps(result)[:500]}")
+                    return "Error: Unexpected API response format."
             except urllib.error.HTTPError as e:
-                if e.code in (401, 403, 429):
+                if e.code in (401, 403) or (e.code == 429 and retries >= self.retry_limit):
                     self.circuit_open = True
                     raise FatalError(f"Fatal API Error {e.code}: {e.reason}")
 
-                if e.code in (500, 502, 503, 504) and retries < self.retry_limit:
+                if e.code == 413 or (e.code == 400 and self._is_context_length_error(e)):
+                    raise PromptTooLargeError(f"HTTP {e.code} - prompt exceeds model input limit")
+
+                if e.code in (429, 500, 502, 503, 504) and retries < self.retry_limit:
                     retries += 1
-                    wait = (2 ** retries) + (random.random() * 0.3)
-                    time.sleep(wait)
+                    wait = _backoff_delay(retries, _retry_after(e.headers))
+                    if self._halt.wait(wait):
+                        return "Error: Circuit breaker open."
                     continue
                 return f"Error: HTTP {e.code} - {e.reason}"
             except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
                 if retries < self.retry_limit:
                     retries += 1
-                    wait = (2 ** retries) + (random.random() * 0.3)
-                    time.sleep(wait)
+                    wait = _backoff_delay(retries)
+                    if self._halt.wait(wait):
+                        return "Error: Circuit breaker open."
                     continue
                 return f"Error: Network error ({str(e)})"
             except TruncatedResponseError:
@@ -279,36 +793,250 @@ class LogicIndexer:
                 return f"Error: {str(e)}"
         return "Error: Maximum retries exceeded."
 
-    def parse_file(self, file_path, parser):
-        """Parses a source file using the given language parser."""
-        rel_path = os.path.relpath(file_path, self.root_dir).replace(os.sep, '/')
+    def _make_ssl_context(self):
+        context = ssl.create_default_context()
+        if not self.verify_ssl:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def _init_transport(self):
+        """Creates the SSL context and HTTP client(s) for the LLM phase.
+
+        Deferred from __init__: the SSL context and the httpx import take ~0.13s, most of a
+        warm run that has nothing to summarize.
+        """
+        # One context for all connections and threads, so the CA store is loaded only once.
+        self.ssl_context = self._make_ssl_context()
+
+        # Stdlib fallback: one keep-alive connection per worker thread, unless a proxy applies
+        # (only urllib honours HTTP(S)_PROXY).
+        self._url_parts = urllib.parse.urlsplit(self.base_url)
+        self._url_path = self._url_parts.path + (f"?{self._url_parts.query}" if self._url_parts.query else "")
+        self._use_keepalive = self._url_parts.scheme in ("http", "https") and (
+            self._url_parts.scheme not in urllib.request.getproxies()
+            or bool(self._url_parts.hostname and urllib.request.proxy_bypass(self._url_parts.hostname))
+        )
+        if _import_httpx():
+            # One shared client for all worker threads. When the server negotiates HTTP/2 the
+            # requests multiplex over a single connection; the pool only grows past one
+            # connection for HTTP/1.1 servers, which would otherwise serialize the workers.
+            self.http_client = httpx.Client(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                verify=self.ssl_context,
+                limits=httpx.Limits(max_connections=self.max_workers, max_keepalive_connections=self.max_workers),
+            )
+
+    def _post_limited(self, url, body, headers):
+        """_post() gated by the adaptive concurrency controller; 429s and latencies feed back into it."""
+        started = self.concurrency.acquire()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.circuit_open:
+            self.concurrency.release(started, ok=False)
+            raise FatalError("Circuit breaker open.")
+        ok = False
+        rate_limited = False
+        try:
+            result = self._post(url, body, headers)
+            ok = True
+            return result
+        except urllib.error.HTTPError as e:
+            rate_limited = e.code == 429
+            if rate_limited and self.rate_limiter is not None:
+                self.rate_limiter.penalize(2.0)
+            raise
+        finally:
+            self.concurrency.release(started, ok=ok, rate_limited=rate_limited)
+
+    def _post(self, url, body, headers):
+        """POSTs body and returns the decoded response text.
+
+        Uses the shared httpx client when available, urllib otherwise. Error statuses and
+        network failures are raised as urllib/builtin exceptions so the retry logic in
+        _call_llm() handles both transports the same way.
+        """
+        if self.http_client is None:
+            if url == self.base_url and self._use_keepalive:
+                return self._post_keepalive(url, body, headers)
+            req = urllib.request.Request(url, data=body, headers=headers)
+            with urllib.request.urlopen(req, context=self.ssl_context, timeout=self.timeout) as response:
+                return response.read().decode('utf-8')
+
+        try:
+            response = self.http_client.post(url, content=body, headers=headers)
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        if response.status_code >= 400:
+            raise urllib.error.HTTPError(url, response.status_code, response.reason_phrase,
+                                         response.headers, io.BytesIO(response.content))
+        return response.content.decode('utf-8')
+
+    def _drop_keepalive(self, conn, error):
+        """Closes this thread's failed connection and returns the exception to raise for error.
+
+        Timeouts and connection errors pass through; other socket or protocol errors are
+        wrapped in URLError, as urllib raises them.
+        """
+        conn.close()
+        self._keepalive_conns.discard(conn)
+        self._conn_local.conn = None
+        if isinstance(error, (TimeoutError, ConnectionError)) or not isinstance(error, (OSError, http.client.HTTPException)):
+            return error
+        return urllib.error.URLError(error)
+
+    def _post_keepalive(self, url, body, headers):
+        """POSTs over this thread's persistent http.client connection, reconnecting once if it went stale."""
+        conn = getattr(self._conn_local, "conn", None)
+        reused = conn is not None
+        while True:
+            if conn is None:
+                if self._url_parts.scheme == "https":
+                    conn = http.client.HTTPSConnection(self._url_parts.netloc, timeout=self.connect_timeout, context=self.ssl_context)
+                else:
+                    conn = http.client.HTTPConnection(self._url_parts.netloc, timeout=self.connect_timeout)
+                self._conn_local.conn = conn
+                self._keepalive_conns.add(conn)
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    conn.sock.settimeout(self.timeout)
+                conn.request("POST", self._url_path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.BadStatusLine, BrokenPipeError, ConnectionResetError):
+                # No reply came back: on a reused connection the server most likely closed it
+                # while idle, so the request is sent once more on a fresh one.
+                conn.close()
+                self._keepalive_conns.discard(conn)
+                conn = self._conn_local.conn = None
+                if not reused:
+                    raise
+                reused = False
+                continue
+            except Exception as e:
+                raise self._drop_keepalive(conn, e)
+            break
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                source = f.read()
+            data = response.read()
+        except Exception as e:
+            # Part of the reply already arrived, so the request is not resent here.
+            raise self._drop_keepalive(conn, e)
+
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(data))
+        return data.decode('utf-8')
+
+    @staticmethod
+    def _is_context_length_error(http_error):
+        """Checks whether an HTTP 400 body reports an oversized prompt rather than a malformed request."""
+        try:
+            body = http_error.read().decode('utf-8', 'replace').lower()
+        except Exception:
+            return False
+        return any(marker in body for marker in ("context length", "context_length", "too long", "too many tokens"))
+
+    def _dep_entries(self, imp_path):
+        """Returns (name, short_name, b"name:summary") for each summarized symbol of a cached file.
+
+        Built once per imported file and shared by every file importing it. Entries are UTF-8
+        bytes, whose sort order matches that of the original strings.
+        """
+        entries = self._dep_entry_cache.get(imp_path)
+        if entries is None:
+            entries = []
+            for sym in self.cache.get(imp_path, {}).get("symbols", []):
+                if sym.get("summary"):
+                    name = sym['name']
+                    short_name = name.rsplit(".", 1)[-1] if "." in name else None
+                    entries.append((name, short_name, f"{name}:{sym['summary']}".encode('utf-8')))
+            self._dep_entry_cache[imp_path] = entries
+        return entries
+
+    def _deps_signature(self, import_paths):
+        """Digest of the cached symbols of the imported files, i.e. every input to dep_summaries
+        besides the file's own source."""
+        h = hashlib.blake2b(digest_size=16)
+        for imp_path in sorted(import_paths):
+            digest = self._deps_signatures.get(imp_path)
+            if digest is None:
+                part = hashlib.blake2b(imp_path.encode('utf-8'), digest_size=16)
+                for sym in self.cache.get(imp_path, {}).get("symbols", []):
+                    part.update(f"\0{sym['name']}\0{sym.get('summary') or ''}".encode('utf-8'))
+                digest = self._deps_signatures[imp_path] = part.digest()
+            h.update(digest)
+        return h.hexdigest()
+
+    def _reuse_unchanged(self, cached_file, st):
+        """Returns a copy of the cached file node if the file is untouched since the last run.
+
+        The file counts as untouched when its mtime/size match and the cached summaries of its
+        imports are the ones its hash was computed from, so parse_file() would reproduce the
+        record exactly. Files with symbols still awaiting a summary must be parsed to queue them.
+        The caller only asks while the set of source files is the one imports were resolved against:
+        a file added or removed elsewhere can change where an unchanged import statement points.
+        """
+        if not cached_file or "dep_digest" not in cached_file:
+            return None
+        if cached_file.get("mtime_ns") != st.st_mtime_ns or cached_file.get("size") != st.st_size:
+            return None
+        symbols = cached_file.get("symbols", [])
+        if not all(sym.get("summary") for sym in symbols):
+            return None
+        if cached_file.get("deps_sig") != self._deps_signature(cached_file.get("imports", [])):
+            return None
+
+        file_node = dict(cached_file)
+        file_node["symbols"] = [dict(sym) for sym in symbols]
+        dep_digest = cached_file["dep_digest"]
+        for symbol_data in file_node["symbols"]:
+            content_key = self._calculate_hash(symbol_data["hash"], dep_digest)
+            self._symbol_keys.append((content_key, symbol_data))
+        return file_node
+
+    def parse_file(self, file_path, rel_path, parser, st=None):
+        """Parses a source file using the given language parser.
+
+        st is the file's stat taken before reading (the walk's, when it has one).
+        """
+        if st is None:
+            try:
+                st = os.stat(file_path)
+            except OSError as e:
+                print(f"Skipping {rel_path}: {e}")
+                return None
+
+        try:
+            source = _read_source(file_path)
         except Exception as e:
             print(f"Skipping {rel_path}: {e}")
             return None
 
         imports = parser.resolve_imports(source, file_path, self.root_dir)
         used_names = parser.collect_used_names(source)
-        is_complex = any(ind in source for ind in parser.get_complexity_indicators())
+        is_complex = parser.is_complex(source)
 
         dep_summaries = []
         for imp_path, has_alias in imports.items():
-            cached_imp = self.cache.get(imp_path)
-            if cached_imp:
-                for sym in cached_imp.get("symbols", []):
-                    if sym.get("summary"):
-                        is_used = sym['name'] in used_names
-                        if not is_used and "." in sym['name']:
-                            short_name = sym['name'].split(".")[-1]
-                            is_used = short_name in used_names
-                        if is_complex or has_alias or is_used:
-                            dep_summaries.append(f"{sym['name']}:{sym['summary']}")
-
-        extra_data = "|".join(sorted(dep_summaries))
-        file_hash = self._calculate_hash(source, extra_data)
+            for name, short_name, entry in self._dep_entries(imp_path):
+                if is_complex or has_alias or name in used_names or (short_name and short_name in used_names):
+                    dep_summaries.append(entry)
+        dep_summaries.sort()
+
+        # Same digests as _calculate_hash(source, "|".join(dep_summaries)), streamed without the join.
+        file_hasher = hashlib.blake2b(_strip_whitespace(source).encode('utf-8'), digest_size=16)
+        dep_hasher = hashlib.blake2b(digest_size=16)
+        for i, entry in enumerate(dep_summaries):
+            if i:
+                file_hasher.update(b"|")
+                dep_hasher.update(b"|")
+            file_hasher.update(entry)
+            dep_hasher.update(entry)
+        file_hash = file_hasher.hexdigest()
+        dep_digest = dep_hasher.hexdigest()
 
         import_list = list(imports.keys())
         file_node = {
@@ -318,32 +1046,104 @@ class LogicIndexer:
             "language": parser.__class__.__name__,
             "symbols": []
         }
-
+        # A file modified within the mtime granularity window could change again without
+        # moving mtime; leave it without a stat signature so the next run re-reads it.
+        if time.time_ns() - st.st_mtime_ns > RACY_MTIME_NS:
+            file_node.update({
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+                "dep_digest": dep_digest,
+                "deps_sig": self._deps_signature(import_list),
+            })
+
+        # Summaries from the previous run, reusable only while the dependency-aware file hash holds.
         cached_file = self.cache.get(rel_path)
-        file_changed = not cached_file or cached_file.get("hash") != file_hash
+        cached_summaries = {}
+        if cached_file and cached_file.get("hash") == file_hash:
+            for s in cached_file.get("symbols", []):
+                cached_summaries.setdefault((s["name"], s.get("hash")), s.get("summary"))
 
+        queued = len(self.dirty_nodes)
         symbols = parser.parse_symbols(source, file_path)
         for sym_info in symbols:
-            self._process_symbol(sym_info, file_node, file_changed, cached_file, parser)
+            self._process_symbol(sym_info, file_node, cached_summaries, parser, dep_digest)
+        if len(self.dirty_nodes) > queued:
+            # Kept for the LLM phase so the file is not read a second time.
+            self._sources[rel_path] = source
 
         return file_node
 
-    def _process_symbol(self, sym_info, file_node, file_changed, cached_file, parser):
-        """Process a single extracted symbol: check cache, extract docstring, queue for LLM."""
+    def _parse_view_of_cache(self):
+        """The slice of the cache parse workers read: file hashes and each symbol's name, hash
+        and summary. Keeps the initializer payload small where pool processes are spawned
+        (Windows/macOS) and the cache has to be pickled to every worker."""
+        return {
+            path: {
+                "hash": node.get("hash"),
+                "symbols": [
+                    {"name": s["name"], "hash": s.get("hash"), "summary": s.get("summary")}
+                    for s in node.get("symbols", [])
+                ],
+            }
+            for path, node in self.cache.items() if path != "_meta"
+        }
+
+    def _parse_all(self, tasks):
+        """Yields parse_file() results for (full_path, rel_path, parser, st) tasks.
+
+        Large scans are spread over a process pool; small ones (the editor-loop case) stay
+        serial since pool start-up would dominate. Falls back to serial if the pool breaks.
+        """
+        done = 0
+        if self.parse_workers > 1 and len(tasks) >= PARSE_POOL_MIN_FILES:
+            parser_index = {id(p): i for i, p in enumerate(self.parsers)}
+            jobs = [(full_path, rel_path, parser_index[id(parser)], st) for full_path, rel_path, parser, st in tasks]
+            try:
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    initializer=_init_parse_worker,
+                    initargs=(self.root_dir, self._parse_view_of_cache(), self.hash_cache, self.filter_small),
+                ) as pool:
+                    for file_node, dirty, symbol_keys, deduplicated, source in pool.map(_parse_one, jobs, chunksize=16):
+                        parser = tasks[done][2]
+                        done += 1
+                        if file_node:
+                            for symbol, segment, content_key in dirty:
+                                self.dirty_nodes.append((file_node["path"], symbol, segment, parser, content_key))
+                            if source is not None:
+                                self._sources[file_node["path"]] = source
+                            self._symbol_keys.extend(symbol_keys)
+                            self.stats["deduplicated"] += deduplicated
+                        yield file_node
+            except (OSError, concurrent.futures.BrokenExecutor) as e:
+                print(f"Warning: Parallel parsing unavailable ({e}). Continuing serially...")
+
+        for full_path, rel_path, parser, st in tasks[done:]:
+            yield self.parse_file(full_path, rel_path, parser, st)
+
+    def _process_symbol(self, sym_info, file_node, cached_summaries, parser, dep_digest):
+        """Process a single extracted symbol: check cache, extract docstring, queue for LLM.
+
+        Symbols are also keyed by content (symbol hash + dependency digest), so identical code
+        seen in another file or a previous run reuses its summary instead of hitting the LLM.
+        """
         symbol_hash = self._calculate_hash(sym_info.source_segment)
+        content_key = self._calculate_hash(symbol_hash, dep_digest)
 
-        summary = None
-        if not file_changed and cached_file:
-            for s in cached_file.get("symbols", []):
-                if s["name"] == sym_info.name and s.get("hash") == symbol_hash:
-                    summary = s.get("summary")
-                    break
+        summary = cached_summaries.get((sym_info.name, symbol_hash))
+
+        if not summary:
+            summary = self.hash_cache.get(content_key)
+            if summary:
+                self.stats["deduplicated"] += 1
 
         if not summary:
             if sym_info.docstring:
                 lines = [line.strip() for line in sym_info.docstring.splitlines() if line.strip()]
                 if lines:
                     summary = "[Doc] " + " ".join(lines[:3])
+            elif self.filter_small and sym_info.auto_summary:
+                summary = sym_info.auto_summary
             elif self.filter_small and len(sym_info.source_segment.splitlines()) < 3:
                 summary = "Small utility function."
 
@@ -356,8 +1156,9 @@ class LogicIndexer:
             "summary": summary
         }
 
+        self._symbol_keys.append((content_key, symbol_data))
         if not summary:
-            self.dirty_nodes.append((file_node["path"], symbol_data, sym_info.source_segment, parser))
+            self.dirty_nodes.append((file_node["path"], symbol_data, sym_info.source_segment, parser, content_key))
 
         file_node["symbols"].append(symbol_data)
 
@@ -370,31 +1171,53 @@ class LogicIndexer:
         except Exception:
             return "Task: Summarize source code: {source_code}"
 
+    def _render_prompt(self, parser, **values):
+        """Renders the parser's prompt template, compiling it on first use."""
+        renderer = self._prompt_renderers.get(parser)
+        if renderer is None:
+            with self._prompt_lock:
+                renderer = self._prompt_renderers.get(parser)
+                if renderer is None:
+                    renderer = _compile_prompt_template(self._load_prompt_template(parser))
+                    self._prompt_renderers[parser] = renderer
+        return renderer(lang=self.lang, **values)
+
+    def _source_of(self, file_path):
+        """Returns the source parse_file() kept for a queued file, reading it only if missing."""
+        source = self._sources.get(file_path)
+        if source is None:
+            source = _read_source(os.path.join(self.root_dir, file_path))
+        return source
+
+    def _atomic_jobs(self, items, context_summaries, parser):
+        """Follow-up jobs summarizing each symbol on its own (Atomic Mode)."""
+        return [(self._run_atomic_task, (symbol, segment, context_summaries, parser)) for symbol, segment in items]
+
     def _worker_task(self, file_path, items, context_summaries, parser):
-        """Processes multiple symbols for a single file."""
+        """Processes multiple symbols for a single file.
+
+        Returns atomic-mode follow-up jobs when the file cannot be batched; process_llm_queue()
+        spreads those over all workers instead of this thread running them one by one.
+        """
         if self.circuit_open:
             return
 
         try:
-            with open(os.path.join(self.root_dir, file_path), 'r', encoding='utf-8') as f:
-                source_code = f.read()
+            source_code = self._source_of(file_path)
         except Exception as e:
             print(f"Error reading {file_path} for batch: {e}")
             return
 
         if len(source_code) / 3 > 30000:
             print(f"File {file_path} too large for batch. Falling back to atomic mode.")
-            for symbol, segment in items:
-                self._run_atomic_task(symbol, segment, context_summaries, parser)
-            return
+            return self._atomic_jobs(items, context_summaries, parser)
 
         target_names = [item[0]['name'] for item in items]
-        prompt_template = self._load_prompt_template(parser)
-        prompt = prompt_template.format(
+        prompt = self._render_prompt(
+            parser,
             source_code=source_code,
             target_symbols=", ".join(target_names),
-            context_summaries=context_summaries,
-            lang=self.lang
+            context_summaries=context_summaries
         )
 
         try:
@@ -411,22 +1234,128 @@ class LogicIndexer:
                 else:
                     print(f"Warning: No summary returned for {symbol['name']} in {file_path}")
 
-        except (json.JSONDecodeError, TruncatedResponseError) as e:
+        except (json.JSONDecodeError, TruncatedResponseError, PromptTooLargeError) as e:
             print(f"Batch failed for {file_path} ({str(e)}). Switching to atomic mode...")
-            for symbol, segment in items:
-                self._run_atomic_task(symbol, segment, context_summaries, parser)
+            return self._atomic_jobs(items, context_summaries, parser)
         except Exception as e:
             print(f"Error parsing batch response for {file_path}: {e}")
 
-    def _run_atomic_task(self, symbol, segment, context_summaries, parser):
-        """Runs a single symbol task (Atomic Mode)."""
-        prompt_template = self._load_prompt_template(parser)
-        prompt = prompt_template.format(
+    def _multi_file_task(self, group):
+        """Summarizes several small files of the same language in one request.
+
+        Targets are keyed by (path, name) and listed as "path::Symbol", so names that recur across
+        the files (__init__, main) map back unambiguously. Files the reply does not fully cover
+        are returned as per-file _worker_task() follow-up jobs.
+        """
+        if self.circuit_open:
+            return
+
+        parser = group[0][3]
+        blocks = []
+        targets = {}  # (path, name) -> the symbols of that name in the file
+        ctx_lines = []
+        seen_ctx = set()
+        ctx_chars = 0
+        readable = []
+        for fp, items, context_summaries, _ in group:
+            try:
+                blocks.append(f"### File: {fp}\n{self._source_of(fp)}")
+            except Exception as e:
+                print(f"Error reading {fp} for batch: {e}")
+                continue
+            readable.append((fp, items, context_summaries, parser))
+            for symbol, _ in items:
+                targets.setdefault((fp, symbol['name']), []).append(symbol)
+            for line in context_summaries.splitlines():
+                if line in seen_ctx or ctx_chars + len(line) + 1 > MAX_CTX_CHARS:
+                    continue
+                seen_ctx.add(line)
+                ctx_lines.append(line)
+                ctx_chars += len(line) + 1
+
+        if not readable:
+            return
+
+        prompt = self._render_prompt(
+            parser,
+            source_code="\n\n".join(blocks),
+            target_symbols=", ".join(f"{fp}::{name}" for fp, name in targets)
+            + ' (reply with each "name" exactly as listed here, "path::" prefix included)',
+            context_summaries="\n".join(ctx_lines)
+        )
+
+        try:
+            res = self._call_llm(prompt)
+            if isinstance(res, str) and res.startswith("Error:"):
+                print(f"API Error for batch of {len(readable)} files: {res}")
+                return
+            by_bare_name = {}
+            for (fp, name), symbols in targets.items():
+                by_bare_name.setdefault(name, []).append(symbols)
+            for s in json.loads(res):
+                if not isinstance(s, dict) or 'summary' not in s or not isinstance(s.get('name'), str):
+                    continue
+                # Paths hold no "::", so the first one ends the path even in C++ names (a.cpp::ns::f).
+                fp, sep, name = s['name'].partition("::")
+                symbols = targets.get((fp, name)) if sep else None
+                if symbols is None and len(by_bare_name.get(s['name'], ())) == 1:
+                    symbols = by_bare_name[s['name']][0]
+                for symbol in symbols or ():
+                    symbol['summary'] = s['summary']
+        except (json.JSONDecodeError, TruncatedResponseError, PromptTooLargeError) as e:
+            print(f"Batch of {len(readable)} files failed ({str(e)}). Switching to per-file mode...")
+        except FatalError:
+            raise
+        except Exception as e:
+            print(f"Error parsing multi-file batch response: {e}")
+
+        follow_ups = []
+        for fp, items, context_summaries, file_parser in readable:
+            missing = [(symbol, segment) for symbol, segment in items if not symbol.get('summary')]
+            if missing and not self.circuit_open:
+                follow_ups.append((self._worker_task, (fp, missing, context_summaries, file_parser)))
+        return follow_ups
+
+    def _pack_batches(self, batch_args):
+        """Groups small files of the same parser into multi-file batches of up to batch_files
+        entries and BATCH_SOURCE_CHARS characters of source, so one reply can cover them all."""
+        groups = []
+        open_groups = {}
+        for args in batch_args:
+            fp, _, _, parser = args
+            source = self._sources.get(fp)
+            if source is not None:
+                size = len(source)
+            else:
+                try:
+                    size = os.path.getsize(os.path.join(self.root_dir, fp))
+                except OSError:
+                    size = None
+            if self.batch_files <= 1 or size is None or size > SMALL_FILE_CHARS:
+                groups.append([args])
+                continue
+            group, chars = open_groups.get(parser, (None, 0))
+            if group is None or len(group) >= self.batch_files or chars + size > BATCH_SOURCE_CHARS:
+                group, chars = [], 0
+                groups.append(group)
+            group.append(args)
+            open_groups[parser] = (group, chars + size)
+        return groups
+
+    def _atomic_prompt(self, symbol, segment, context_summaries, parser):
+        """Prompt for a single symbol, its source truncated to MAX_SEGMENT_CHARS."""
+        if len(segment) > MAX_SEGMENT_CHARS:
+            segment = segment[:MAX_SEGMENT_CHARS] + "\n... [truncated]"
+        return self._render_prompt(
+            parser,
             source_code=segment,
             target_symbols=symbol['name'],
-            context_summaries=context_summaries,
-            lang=self.lang
+            context_summaries=context_summaries
         )
+
+    def _run_atomic_task(self, symbol, segment, context_summaries, parser):
+        """Runs a single symbol task (Atomic Mode)."""
+        prompt = self._atomic_prompt(symbol, segment, context_summaries, parser)
         try:
             res = self._call_llm(prompt)
             data = json.loads(res)
@@ -434,21 +1363,199 @@ class LogicIndexer:
         except Exception:
             symbol['summary'] = "Error generating summary (Atomic fallback failed)"
 
+    def _api_request(self, method, path, body=None, content_type="application/json"):
+        """Sends a request to the API root (base URL without /chat/completions); returns the body bytes."""
+        url = self.base_url.rsplit("/chat/completions", 1)[0] + path
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        if body is not None:
+            headers["Content-Type"] = content_type
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        context = self.ssl_context or self._make_ssl_context()
+        with urllib.request.urlopen(req, context=context, timeout=self.timeout) as response:
+            return response.read()
+
+    def _submit_batch(self, batch_args, owners):
+        """Submits every pending summary request as one OpenAI Batch API job (LOGIC_INDEX_BATCH_API).
+
+        Batch jobs cost half as much and bypass per-minute rate limits, but finish within 24h
+        rather than now. The job id and the (symbol name, content key) pairs behind each
+        request are kept in the cache's _meta; a later run merges the results into hash_cache
+        (_collect_batch) before parsing, so the symbols resolve like any other cache hit.
+        Returns False when the job could not be created; the caller then calls the API live.
+        """
+        if not self.base_url.endswith("/chat/completions"):
+            print("Warning: LOGIC_INDEX_BATCH_API needs a .../chat/completions base URL. Calling the API directly.")
+            return False
+
+        content_keys = {id(symbol): key for key, symbol in owners.items()}
+        lines = []
+        requests = {}
+        for fp, items, context_summaries, parser in batch_args:
+            try:
+                source_code = self._source_of(fp)
+            except Exception as e:
+                print(f"Error reading {fp} for batch: {e}")
+                continue
+            if len(source_code) / 3 > 30000:
+                # Names repeat within a file (property setters, overloads, redefinitions) and the API
+                # rejects an input file with duplicate custom_ids, so the item index is part of the id.
+                units = [(f"{fp}::{i}::{symbol['name']}", [(symbol, segment)],
+                          self._atomic_prompt(symbol, segment, context_summaries, parser))
+                         for i, (symbol, segment) in enumerate(items)]
+            else:
+                prompt = self._render_prompt(
+                    parser,
+                    source_code=source_code,
+                    target_symbols=", ".join(symbol['name'] for symbol, _ in items),
+                    context_summaries=context_summaries
+                )
+                units = [(fp, items, prompt)]
+            for custom_id, unit_items, prompt in units:
+                lines.append(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": self._chat_request(prompt),
+                }, ensure_ascii=False))
+                requests[custom_id] = [[symbol['name'], content_keys[id(symbol)]] for symbol, _ in unit_items]
+                self.stats["token_usage_estimate"] += len(prompt) // 4
+        if not lines:
+            return False
+
+        payload = ("\n".join(lines) + "\n").encode('utf-8')
+        boundary = os.urandom(16).hex()
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="purpose"\r\n\r\nbatch\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="logic_index_batch.jsonl"\r\n'
+            f'Content-Type: application/jsonl\r\n\r\n'
+        ).encode('utf-8') + payload + f"\r\n--{boundary}--\r\n".encode('utf-8')
+        try:
+            uploaded = json.loads(self._api_request("POST", "/files", body, f"multipart/form-data; boundary={boundary}"))
+            batch = json.loads(self._api_request("POST", "/batches", json.dumps({
+                "input_file_id": uploaded["id"],
+                "endpoint": "/v1/chat/completions",
+                "completion_window": "24h",
+            }).encode('utf-8')))
+            batch_id = batch["id"]
+        except Exception as e:
+            print(f"Warning: Batch submission failed ({e}). Calling the API directly.")
+            return False
+
+        self.pending_batch = {"id": batch_id, "requests": requests}
+        self.stats["api_calls"] += 2
+        print(f"Submitted batch {batch_id} with {len(lines)} requests. "
+              f"Run the indexer again once it completes to merge the summaries.")
+        return True
+
+    def _collect_batch(self):
+        """Merges the results of the Batch API job from an earlier run into hash_cache.
+
+        A job still running stays pending. A finished one (including failed, expired or
+        cancelled jobs, which may carry partial output) is merged and dropped; requests without
+        a usable result are simply queued again by this run. After a failed or expired job this
+        run calls the API live instead of submitting the same requests to fail again. So does a
+        job the API rejects outright (deleted, or a different key or base URL than it came from),
+        which would otherwise stay pending for good.
+        """
+        batch_id = self.pending_batch["id"]
+        try:
+            batch = json.loads(self._api_request("GET", f"/batches/{batch_id}"))
+            status = batch.get("status")
+            if status not in ("completed", "failed", "expired", "cancelled"):
+                print(f"Batch {batch_id} is {status}.")
+                self.pending_batch_status = status
+                return
+            output = b""
+            if batch.get("output_file_id"):
+                output = self._api_request("GET", f"/files/{batch['output_file_id']}/content")
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code != 429:
+                print(f"Warning: Batch {batch_id} was rejected by the API (HTTP {e.code}). "
+                      f"Dropping it and calling the API directly.")
+                self.pending_batch = None
+                self.use_batch_api = False
+            else:
+                print(f"Warning: Could not fetch batch {batch_id} ({e}). Will retry on the next run.")
+            return
+        except Exception as e:
+            print(f"Warning: Could not fetch batch {batch_id} ({e}). Will retry on the next run.")
+            return
+
+        merged = 0
+        requests = self.pending_batch["requests"]
+        for line in output.splitlines():
+            try:
+                record = json.loads(line)
+                symbols = requests.get(record.get("custom_id"))
+                content = record["response"]["body"]["choices"][0]["message"]["content"]
+                data = json.loads(_strip_code_fence(content.strip()))
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if not symbols:
+                continue
+            if isinstance(data, dict):
+                data = [data]
+            summaries = {s['name']: s['summary'] for s in data if isinstance(s, dict) and 'name' in s and 'summary' in s}
+            for name, content_key in symbols:
+                summary = summaries.get(name)
+                # Single-symbol (atomic) replies are not always keyed by the requested name.
+                if summary is None and len(symbols) == 1 and data and isinstance(data[0], dict):
+                    summary = data[0].get('summary')
+                if isinstance(summary, str) and summary:
+                    self.hash_cache[content_key] = summary
+                    merged += 1
+        print(f"Batch {batch_id} {status}: merged {merged} summaries.")
+        self.pending_batch = None
+        if status in ("failed", "expired"):
+            print("Calling the API directly for the remaining symbols.")
+            self.use_batch_api = False
+
+    def _checkpoint(self):
+        """Saves the cache mid-run so summaries already paid for survive a crash or kill.
+
+        Workers only ever replace the value of a symbol's existing "summary" key, so the cache
+        can be serialized while they run; the atomic write keeps the previous file until done.
+        """
+        try:
+            self._save_cache()
+        except Exception as e:
+            print(f"\nWarning: Checkpoint failed ({e}).")
+
     def process_llm_queue(self):
         """Process dirty nodes grouped by file to minimize API calls."""
         if not self.dirty_nodes:
             return
+        # Without batch mode the symbols are summarized live; the job is still collected once it ends.
+        if self.pending_batch and self.use_batch_api:
+            if self.pending_batch_status:
+                print(f"Batch {self.pending_batch['id']} is {self.pending_batch_status}; "
+                      f"{len(self.dirty_nodes)} symbols will be summarized after it completes.")
+            else:
+                print(f"Batch {self.pending_batch['id']} could not be checked; "
+                      f"{len(self.dirty_nodes)} symbols will be summarized once it is collected.")
+            return
 
         batches = {}
         parser_map = {}
-        for file_path, symbol, segment, parser in self.dirty_nodes:
+        owners = {}
+        followers = []
+        for file_path, symbol, segment, parser, content_key in self.dirty_nodes:
+            owner = owners.get(content_key)
+            if owner is not None:
+                followers.append((symbol, owner))
+                continue
+            owners[content_key] = symbol
             if file_path not in batches:
                 batches[file_path] = []
                 parser_map[file_path] = parser
             batches[file_path].append((symbol, segment))
 
-        print(f"Generating summaries for {len(self.dirty_nodes)} symbols across {len(batches)} files (Workers: {self.max_workers})...")
+        self.stats["deduplicated"] += len(followers)
+        print(f"Generating summaries for {len(owners)} symbols across {len(batches)} files "
+              f"({len(followers)} duplicates reused, Workers: {self.max_workers})...")
 
+        # Context lines per imported file (and their joined length), built once and shared by every importer.
+        context_lines = {}
         batch_args = []
         for fp, items in batches.items():
             file_node = self.cache.get(fp)
@@ -457,44 +1564,83 @@ class LogicIndexer:
                 dep_list = []
                 current_chars = 0
                 for imp_path in file_node["imports"]:
-                    cached_imp = self.cache.get(imp_path)
-                    if cached_imp:
-                        for s in cached_imp.get("symbols", []):
-                            if s.get("summary"):
-                                line = f"- {s['name']}: {s['summary']}"
-                                if current_chars + len(line) + 1 > MAX_CTX_CHARS:
-                                    print(f"Warning: Dependency context truncated for {fp} (Limit: {MAX_CTX_CHARS} chars)")
-                                    break
-                                dep_list.append(line)
-                                current_chars += len(line) + 1
-                        if current_chars > MAX_CTX_CHARS:
+                    entry = context_lines.get(imp_path)
+                    if entry is None:
+                        cached_imp = self.cache.get(imp_path) or {}
+                        lines = [f"- {s['name']}: {s['summary']}" for s in cached_imp.get("symbols", []) if s.get("summary")]
+                        entry = context_lines[imp_path] = (lines, sum(len(line) + 1 for line in lines))
+                    lines, total_chars = entry
+                    if current_chars + total_chars <= MAX_CTX_CHARS:
+                        dep_list.extend(lines)
+                        current_chars += total_chars
+                        continue
+                    for line in lines:
+                        if current_chars + len(line) + 1 > MAX_CTX_CHARS:
+                            print(f"Warning: Dependency context truncated for {fp} (Limit: {MAX_CTX_CHARS} chars)")
                             break
+                        dep_list.append(line)
+                        current_chars += len(line) + 1
                 ctx_summary = "\n".join(dep_list)
             batch_args.append((fp, items, ctx_summary, parser_map[fp]))
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = [executor.submit(self._worker_task, *args) for args in batch_args]
-            try:
-                for future in concurrent.futures.as_completed(futures):
+        if self.use_batch_api and self._submit_batch(batch_args, owners):
+            return
+        # After the batch branch: a submitted job needs no live client, and every client opened
+        # here is closed by the finally below.
+        self._init_transport()
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Biggest jobs first (reply length, and so latency, grows with the number of
+                # symbols): a large file started last would otherwise run alone at the tail.
+                groups = self._pack_batches(batch_args)
+                groups.sort(key=lambda group: sum(len(args[1]) for args in group), reverse=True)
+                pending = set()
+                for group in groups:
+                    if len(group) == 1:
+                        pending.add(executor.submit(self._worker_task, *group[0]))
+                    else:
+                        pending.add(executor.submit(self._multi_file_task, group))
+                try:
+                    # Tasks hand fallback work back as (fn, args) jobs, queued on the same executor
+                    # rather than run (or waited on) inside the worker that produced them.
+                    last_checkpoint = time.monotonic()
+                    while pending and not self.circuit_open:
+                        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            try:
+                                for fn, args in future.result() or ():
+                                    if not self.circuit_open:
+                                        pending.add(executor.submit(fn, *args))
+                                print(".", end="", flush=True)
+                            except FatalError as e:
+                                print(f"\n{e}")
+                                self.circuit_open = True
+                            except Exception as e:
+                                print(f"Error processing file batch: {e}")
+                        if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                            self._checkpoint()
+                            last_checkpoint = time.monotonic()
                     if self.circuit_open:
                         executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                    try:
-                        future.result()
-                        print(".", end="", flush=True)
-                    except FatalError as e:
-                        print(f"\n{e}")
-                        self.circuit_open = True
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                    except Exception as e:
-                        print(f"Error processing file batch: {e}")
-            except KeyboardInterrupt:
-                print("\nInterrupted by user. Shutting down...")
-                executor.shutdown(wait=False, cancel_futures=True)
-                raise
-
-    def generate_markdown(self):
+                except KeyboardInterrupt:
+                    print("\nInterrupted by user. Shutting down...")
+                    self.circuit_open = True
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        finally:
+            for symbol, owner in followers:
+                if owner.get("summary"):
+                    symbol["summary"] = owner["summary"]
+            if self.http_client is not None:
+                # Shut the pooled (possibly HTTP/2) connection down cleanly instead of at interpreter exit.
+                self.http_client.close()
+            for conn in list(self._keepalive_conns):
+                conn.close()
+            self._keepalive_conns.clear()
+
+    def generate_markdown(self, out):
+        """Writes the Markdown logic tree line by line to the open text stream out."""
         git_hash = "Unknown"
         try:
             git_hash = subprocess.check_output(
@@ -505,11 +1651,11 @@ class LogicIndexer:
         except Exception:
             pass
 
-        lines = ["# 🧠 逻辑索引 (Logic Index)"]
-        lines.append(f"> Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"> Git Commit: {git_hash}\n")
-        lines.append("> **Symbol Types**: `[C]` Class | `[f]` Function | `[S]` Struct | `[E]` Enum | `[T]` Typedef/TypeAlias | `[M]` Macro | `[N]` Namespace | `[I]` Interface")
-        lines.append("> **Tags**: `[Doc]` From Docstring/Doxygen | `[Source]` Data Source | `[Sink]` Data Sink | `[Util]` Utility | `[Test]` Test\n")
+        out.write("# 🧠 逻辑索引 (Logic Index)\n")
+        out.write(f"> Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        out.write(f"> Git Commit: {git_hash}\n\n")
+        out.write("> **Symbol Types**: `[C]` Class | `[f]` Function | `[S]` Struct | `[E]` Enum | `[T]` Typedef/TypeAlias | `[M]` Macro | `[N]` Namespace | `[I]` Interface\n")
+        out.write("> **Tags**: `[Doc]` From Docstring/Doxygen | `[Source]` Data Source | `[Sink]` Data Sink | `[Util]` Utility | `[Test]` Test\n")
 
         sorted_files = sorted(self.cache.keys())
         for path in sorted_files:
@@ -519,64 +1665,68 @@ class LogicIndexer:
             if not data.get("symbols"):
                 continue
 
-            lines.append(f"## 📄 `{path}`")
+            write = out.write
+            icons = self.SYMBOL_ICONS
+            write(f"\n## 📄 `{path}`\n")
             for sym in data["symbols"]:
-                icon = self._symbol_icon(sym["type"])
-                summary = sym.get("summary", "No summary")
-                name_display = f"{sym['name']}{sym.get('args', '')}"
-                lines.append(f"- **[{icon}]** `{name_display}`: {summary}")
-            lines.append("")
-
-        return "\n".join(lines)
-
-    @staticmethod
-    def _symbol_icon(sym_type):
-        icons = {
-            "class": "C",
-            "function": "f",
-            "struct": "S",
-            "enum": "E",
-            "typedef": "T",
-            "type_alias": "T",
-            "macro": "M",
-            "namespace": "N",
-            "interface": "I",
-        }
-        return icons.get(sym_type, "?")
+                write(f"- **[{icons.get(sym['type'], '?')}]** `{sym['name']}{sym.get('args', '')}`: "
+                      f"{sym.get('summary', 'No summary')}\n")
 
     def run(self):
+        if self.pending_batch and self.api_key:
+            self._collect_batch()
+
         print("Scanning codebase...")
 
         try:
             new_cache = {}
             detected_languages = set()
+            tasks = []
+            candidates = []
 
-            for root, dirs, files in os.walk(self.root_dir):
-                dirs[:] = [d for d in dirs if not self._is_excluded(os.path.join(root, d))]
-
-                for file in files:
-                    self.stats["total_files"] += 1
-                    full_path = os.path.join(root, file)
+            for entry, rel_path in self._walk(self.root_dir):
+                self.stats["total_files"] += 1
+                full_path = entry.path
 
-                    if self._is_excluded(full_path):
-                        continue
+                if self._is_excluded(full_path, is_dir=False, rel_path=rel_path):
+                    continue
 
-                    parser = self._get_parser_for_file(file)
-                    if not parser:
-                        continue
+                parser = self._get_parser_for_file(rel_path)
+                if not parser:
+                    continue
 
-                    lang_name = parser.__class__.__name__
-                    detected_languages.add(lang_name)
-                    self.stats["languages"][lang_name] = self.stats["languages"].get(lang_name, 0) + 1
-                    self.stats["processed_files"] += 1
+                lang_name = parser.__class__.__name__
+                detected_languages.add(lang_name)
+                self.stats["languages"][lang_name] = self.stats["languages"].get(lang_name, 0) + 1
+                self.stats["processed_files"] += 1
+
+                try:
+                    st = entry.stat()
+                except OSError:
+                    st = None
+                candidates.append((full_path, rel_path, parser, st))
+
+            # Import resolution depends on which source files exist, not just on the importing file.
+            file_set = hashlib.blake2b(
+                "\0".join(sorted(c[1] for c in candidates)).encode('utf-8'), digest_size=16
+            ).hexdigest()
+            reuse = file_set == self.file_set
+            for full_path, rel_path, parser, st in candidates:
+                file_node = self._reuse_unchanged(self.cache.get(rel_path), st) if reuse and st else None
+                if file_node:
+                    new_cache[rel_path] = file_node
+                    continue
+                tasks.append((full_path, rel_path, parser, st))
 
-                    result = self.parse_file(full_path, parser)
-                    if result:
-                        new_cache[result["path"]] = result
-                    else:
-                        self.stats["failed_files"] += 1
+            for result in self._parse_all(tasks):
+                if result:
+                    new_cache[result["path"]] = result
+                else:
+                    self.stats["failed_files"] += 1
 
             self.cache = new_cache
+            self.file_set = file_set
+            self._scan_complete = True
 
             if self.dirty_nodes:
                 if not self.api_key:
@@ -590,25 +1740,33 @@ class LogicIndexer:
         finally:
             self._save_cache()
 
-            md_content = self.generate_markdown()
             os.makedirs(os.path.dirname(OUTPUT_MD), exist_ok=True)
-            with open(OUTPUT_MD, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+            # generate_markdown() writes line by line; a 1 MiB buffer turns that into a few large writes.
+            with _atomic_open(OUTPUT_MD, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                self.generate_markdown(f)
 
             print(f"\nLogic index updated at {OUTPUT_MD}")
 
             duration = time.time() - self.stats["start_time"]
-            print("\n=== Logic Indexer Stats ===")
-            print(f"Version             : {VERSION}")
-            print(f"Total Files Scanned : {self.stats['total_files']}")
-            print(f"Files Processed     : {self.stats['processed_files']}")
+            report = [
+                "\n=== Logic Indexer Stats ===",
+                f"Version             : {VERSION}",
+                f"Total Files Scanned : {self.stats['total_files']}",
+                f"Files Processed     : {self.stats['processed_files']}",
+            ]
             lang_detail = ", ".join(f"{k}: {v}" for k, v in self.stats["languages"].items())
             if lang_detail:
-                print(f"Languages           : {lang_detail}")
-            print(f"Failed Files        : {self.stats['failed_files']}")
-            print(f"API Calls           : {self.stats['api_calls']}")
-            print(f"Total Duration      : {duration:.2f}s")
-            print("===========================\n")
+                report.append(f"Languages           : {lang_detail}")
+            report += [
+                f"Failed Files        : {self.stats['failed_files']}",
+                f"Deduplicated        : {self.stats['deduplicated']}",
+                f"API Calls           : {self.stats['api_calls']}",
+                f"Est. Input Tokens   : {self.stats['token_usage_estimate']}",
+                f"Total Duration      : {duration:.2f}s",
+                "===========================\n",
+            ]
+            # One write instead of one per line through the line-buffered UTF-8 stdout.
+            print("\n".join(report), flush=True)
 
 
 if __name__ == "__main__":